@@ -3,19 +3,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Annotated
-import pickle
-import pandas as pd
+from readiness import ModelState, add_health_routes
+from ratelimit import RateLimitMiddleware
+from profiling import add_profiling
 
 app = FastAPI(title="FAT Prediction API")
 
-# ✅ Load the trained model
-ml_model = None
-try:
-    with open("model_fat.pkl", "rb") as f:  # Use forward slashes for paths
-        ml_model = pickle.load(f)
-except Exception as e:
-    print("⚠️ Could not load ML model:", e)
-
+# Per-client rate limit and per-model concurrency cap on prediction routes
+app.add_middleware(RateLimitMiddleware)
 
 # ✅ Define input schema
 class PredictionInput(BaseModel):
@@ -35,6 +30,18 @@ class PredictionInput(BaseModel):
     Wrist: Annotated[float, Field(..., gt=10, lt=30)]
 
 
+# ✅ Load the trained model in the background; /readyz reports when it's warm
+WARMUP_INPUT = PredictionInput(
+    Density=1.05, Age=35, Weight=72.0, Height=175.0, Neck=38.0, Chest=95.0, Abdomen=85.0,
+    Hip=95.0, Thigh=55.0, Knee=38.0, Ankle=22.0, Biceps=32.0, Forearm=28.0, Wrist=17.0,
+)
+state = ModelState("model_fat.pkl", WARMUP_INPUT.dict())  # Use forward slashes for paths
+add_health_routes(app, state)
+
+# Opt-in sampling profiler (enabled by PROFILE_TOKEN)
+add_profiling(app)
+
+
 # ✅ Root endpoint
 @app.get("/")
 def home():
@@ -44,8 +51,9 @@ def home():
 # ✅ Prediction endpoint
 @app.post("/predict")
 def predict(input_data: PredictionInput):
-    if ml_model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    import pandas as pd
+
+    ml_model = state.require()
 
     # Convert input to DataFrame
     df = pd.DataFrame([input_data.dict()])
@@ -64,4 +72,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],  # lets browsers back off
 )
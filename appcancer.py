@@ -1,12 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import pandas as pd
-import pickle
+from readiness import ModelState, add_health_routes
+from ratelimit import RateLimitMiddleware
+from profiling import add_profiling
 
 # Initialize app
 app = FastAPI(title="Cancer Diagnosis Prediction API")
 
+# Per-client rate limit and per-model concurrency cap on prediction routes
+app.add_middleware(RateLimitMiddleware)
+
 # from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -15,16 +19,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],  # lets browsers back off
 )
-# Load model
-model = None
-try:
-    with open("model_Cancer.pkl", "rb") as f:
-        model = pickle.load(f)
-    print("✅ Model loaded successfully")
-except Exception as e:
-    print("⚠️ Could not load model:", e)
-
 # Define input schema
 class CancerInput(BaseModel):
     Age: int = Field(..., ge=1, le=120)
@@ -36,6 +32,17 @@ class CancerInput(BaseModel):
     AlcoholIntake: float = Field(..., ge=0, le=10)
     CancerHistory: int = Field(..., ge=0, le=1)
 
+# Load model in the background; /readyz reports when it's warm
+WARMUP_INPUT = CancerInput(
+    Age=40, Gender=0, BMI=25.0, Smoking=0, GeneticRisk=0,
+    PhysicalActivity=5.0, AlcoholIntake=2.0, CancerHistory=0,
+)
+state = ModelState("model_Cancer.pkl", WARMUP_INPUT.dict())
+add_health_routes(app, state)
+
+# Opt-in sampling profiler (enabled by PROFILE_TOKEN)
+add_profiling(app)
+
 # Root route
 @app.get("/")
 def home():
@@ -44,10 +51,11 @@ def home():
 # Prediction route
 @app.post("/predict")
 def predict_cancer(data: CancerInput):
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    model = state.require()
 
     try:
+        import pandas as pd
+
         df = pd.DataFrame([data.dict()])
         pred = model.predict(df)[0]
         result = "Cancer Detected" if pred == 1 else "No Cancer"
@@ -2,12 +2,17 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Literal, Annotated
-import pickle
-import pandas as pd
+from explain import PredictionCache, Explainer, cache_key
+from readiness import ModelState, add_health_routes
+from ratelimit import RateLimitMiddleware
+from profiling import add_profiling
 
 # Create FastAPI instance
 app = FastAPI(title="Diabetes Prediction API")
 
+# Per-client rate limit and per-model concurrency cap on prediction routes
+app.add_middleware(RateLimitMiddleware)
+
 from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -16,16 +21,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],  # lets browsers back off
 )
 
-# Load the trained model
-ml_model = None
-try:
-    with open("model_diabetes.pkl", "rb") as f:
-        ml_model = pickle.load(f)
-except Exception as e:
-    print("⚠️ Could not load ML model:", e)
-
 
 # Define input schema
 class DiabetesInput(BaseModel):
@@ -39,6 +37,22 @@ class DiabetesInput(BaseModel):
     blood_glucose_level: Annotated[float, Field(..., ge=50, le=500)]
 
 
+# Cache shared by /predict and /explain
+cache = PredictionCache()
+explainer = Explainer(None, cache)
+
+# Load the trained model in the background; /readyz reports when it's warm
+WARMUP_INPUT = DiabetesInput(
+    gender="Female", age=40, hypertension=0, heart_disease=0, smoking_history="never",
+    bmi=25.0, HbA1c_level=5.5, blood_glucose_level=100,
+)
+state = ModelState("model_diabetes.pkl", WARMUP_INPUT.dict(), on_load=explainer.load)
+add_health_routes(app, state)
+
+# Opt-in sampling profiler (enabled by PROFILE_TOKEN)
+add_profiling(app)
+
+
 # Root endpoint
 @app.get("/")
 def root():
@@ -48,15 +62,29 @@ def root():
 # Prediction endpoint
 @app.post("/predict")
 def predict(input_data: DiabetesInput):
-    if ml_model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    import pandas as pd
+
+    ml_model = state.require()
+
+    row = input_data.dict()
+    cached = cache.get(cache_key(row))
+    if cached is not None:
+        return {"prediction": cached["prediction"]}
 
     # Convert input to DataFrame
-    df = pd.DataFrame([input_data.dict()])
+    df = pd.DataFrame([row])
 
     try:
         # Make prediction
         pred = ml_model.predict(df)
+        cache.put(cache_key(row), prediction=int(pred[0]))
         return {"prediction": int(pred[0])}  # usually 0 or 1
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Explanation endpoint: per-feature contributions to the prediction
+@app.post("/explain")
+async def explain(input_data: DiabetesInput):
+    state.require()
+    return await explainer.explain(input_data.dict())
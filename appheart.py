@@ -2,12 +2,17 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Literal, Annotated
-import pandas as pd
-import pickle
+from explain import PredictionCache, Explainer, cache_key
+from readiness import ModelState, add_health_routes
+from ratelimit import RateLimitMiddleware
+from profiling import add_profiling
 
 # Initialize FastAPI app
 app = FastAPI(title="Heart Disease Prediction API")
 
+# Per-client rate limit and per-model concurrency cap on prediction routes
+app.add_middleware(RateLimitMiddleware)
+
 # Allow frontend access (optional)
 # from fastapi.middleware.cors import CORSMiddleware
 
@@ -17,17 +22,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining"],  # lets browsers back off
 )
 
-# Load the trained model
-model = None
-try:
-    with open("model_HeartDisease.pkl", "rb") as f:
-        model = pickle.load(f)
-    print("✅ Model loaded successfully")
-except Exception as e:
-    print("⚠️ Could not load model:", e)
-
 
 # Define input schema using Pydantic
 class HeartInput(BaseModel):
@@ -44,6 +41,22 @@ class HeartInput(BaseModel):
     ST_Slope: Literal["Up", "Flat", "Down"]
 
 
+# Cache shared by /predict and /explain
+cache = PredictionCache()
+explainer = Explainer(None, cache)
+
+# Load the trained model in the background; /readyz reports when it's warm
+WARMUP_INPUT = HeartInput(
+    Age=40, Sex="M", ChestPainType="ATA", RestingBP=120, Cholesterol=200, FastingBS=0,
+    RestingECG="Normal", MaxHR=150, ExerciseAngina="N", Oldpeak=1.0, ST_Slope="Up",
+)
+state = ModelState("model_HeartDisease.pkl", WARMUP_INPUT.dict(), on_load=explainer.load)
+add_health_routes(app, state)
+
+# Opt-in sampling profiler (enabled by PROFILE_TOKEN)
+add_profiling(app)
+
+
 # Root endpoint
 @app.get("/")
 def home():
@@ -53,15 +66,24 @@ def home():
 # Prediction endpoint
 @app.post("/predict")
 def predict_heart_disease(data: HeartInput):
-    if model is None:
-        raise HTTPException(status_code=500, detail="Model not loaded")
+    model = state.require()
+
+    row = data.dict()
+    cached = cache.get(cache_key(row))
+    if cached is not None:
+        prediction = cached["prediction"]
+        result = "Heart Disease" if prediction == 1 else "No Heart Disease"
+        return {"prediction": prediction, "result": result}
 
     try:
+        import pandas as pd
+
         # Convert input to DataFrame
-        df = pd.DataFrame([data.dict()])
+        df = pd.DataFrame([row])
 
         # Predict
         prediction = model.predict(df)[0]
+        cache.put(cache_key(row), prediction=int(prediction))
         result = "Heart Disease" if prediction == 1 else "No Heart Disease"
 
         return {
@@ -70,3 +92,12 @@ def predict_heart_disease(data: HeartInput):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Explanation endpoint: per-feature contributions to the prediction
+@app.post("/explain")
+async def explain_heart_disease(data: HeartInput):
+    state.require()
+    explanation = await explainer.explain(data.dict())
+    explanation["result"] = "Heart Disease" if explanation["prediction"] == 1 else "No Heart Disease"
+    return explanation
@@ -0,0 +1,221 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from profiling import request_threads, running_for
+
+# ---------- Settings ----------
+CACHE_SIZE = 1024          # cached predictions/explanations per service
+EXPLAIN_BATCH_SIZE = 32    # max rows scored in one contribution call
+EXPLAIN_BATCH_WAIT = 0.005 # seconds to wait for more requests to batch with
+EXPLAIN_BUDGET = 0.5       # seconds an /explain request may wait before 503
+EXPLAIN_MAX_QUEUED = 128   # queued rows allowed before batch timings are known
+
+
+def cache_key(row):
+    return tuple(sorted(row.items()))
+
+
+# LRU cache shared by /predict and /explain
+class PredictionCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, **values):
+        with self.lock:
+            entry = self.entries.pop(key, {})
+            entry.update(values)
+            self.entries[key] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            return entry
+
+
+def split_model(model):
+    # Pipelines: run every step but the last as preprocessing
+    if hasattr(model, "steps"):
+        return model[:-1], model.steps[-1][1]
+    return None, model
+
+
+def native_contributions(estimator, X):
+    # Returns (n_rows, n_features + 1) with the bias term in the last column
+    if hasattr(estimator, "get_booster"):  # XGBoost
+        import xgboost as xgb
+        return estimator.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+    if hasattr(estimator, "booster_"):  # LightGBM
+        return estimator.predict(X, pred_contrib=True)
+    return None
+
+
+def group_by_input(names, values, columns):
+    # Fold one-hot / prefixed feature names (e.g. "cat__Sex_M") back onto the
+    # input field they came from, so clinicians see the fields they entered.
+    grouped = {col: 0.0 for col in columns}
+    by_length = sorted(columns, key=len, reverse=True)
+    for name, value in zip(names, values):
+        base = name.split("__", 1)[-1]
+        match = next((c for c in by_length if base == c or base.startswith(c + "_")), base)
+        grouped[match] = grouped.get(match, 0.0) + float(value)
+    return grouped
+
+
+class Explainer:
+    def __init__(self, model, cache):
+        self.cache = cache
+        self.load(model)
+        # Dedicated worker so explanations never take threads from /predict
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self.pending = []
+        self.flush_handle = None
+        self.tasks = set()
+        self.queued = 0            # rows waiting or being computed
+        self.batch_seconds = None  # moving average of one batch's compute time
+        self.batch_lock = asyncio.Lock()
+
+    def load(self, model):
+        self.model = model
+        self.preprocess, self.estimator = split_model(model)
+        self.supported = model is not None and (
+            hasattr(self.estimator, "get_booster") or hasattr(self.estimator, "booster_")
+        )
+
+    def feature_names(self, X, columns):
+        if self.preprocess is not None and hasattr(self.preprocess, "get_feature_names_out"):
+            return list(self.preprocess.get_feature_names_out())
+        if hasattr(X, "columns"):
+            return list(X.columns)
+        return list(columns)
+
+    def compute(self, rows, thread_sets=()):
+        # thread_sets: let header-profiled requests sample this worker thread
+        with running_for(thread_sets):
+            return self.compute_rows(rows)
+
+    def compute_rows(self, rows):
+        import pandas as pd
+
+        df = pd.DataFrame(rows)
+        X = self.preprocess.transform(df) if self.preprocess is not None else df
+        contribs = native_contributions(self.estimator, X)
+        preds = self.estimator.predict(X)
+        names = self.feature_names(X, df.columns)
+        width = len(names) + 1
+        if contribs.ndim == 2 and contribs.shape[1] != width:
+            # LightGBM multi-class: (n, classes * (features + 1)) -> 3-D
+            contribs = contribs.reshape(len(rows), -1, width)
+
+        results = []
+        for i, row in enumerate(rows):
+            pred = int(preds[i])
+            values = contribs[i]
+            if values.ndim == 2:  # multi-class: explain the predicted class
+                values = values[pred]
+            result = {
+                "prediction": pred,
+                "base_value": float(values[-1]),
+                "contributions": group_by_input(names, values[:-1], df.columns),
+            }
+            self.cache.put(cache_key(row), **result)
+            results.append(result)
+        return results
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            # Keep a reference so the task isn't garbage collected mid-flight
+            task = asyncio.ensure_future(self.run_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def capacity(self):
+        # Rows the worker can get through within the latency budget
+        if self.batch_seconds is None:
+            return EXPLAIN_MAX_QUEUED
+        batches = max(1, int(EXPLAIN_BUDGET / self.batch_seconds))
+        return batches * EXPLAIN_BATCH_SIZE
+
+    def dequeue(self, fut):
+        self.queued -= 1
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        # One batch at a time, so rows whose request already gave up are
+        # dropped right before the worker would spend time on them
+        async with self.batch_lock:
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                return
+            rows = [row for row, _, _ in batch]
+            thread_sets = [threads for _, _, threads in batch]
+            started = loop.time()
+            try:
+                results = await loop.run_in_executor(self.executor, self.compute, rows, thread_sets)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                return
+            finally:
+                elapsed = loop.time() - started
+                self.batch_seconds = (
+                    elapsed if self.batch_seconds is None else 0.8 * self.batch_seconds + 0.2 * elapsed
+                )
+            for (_, fut, _), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    async def explain(self, row):
+        if self.model is None:
+            raise HTTPException(status_code=503, detail="Model is still loading, retry shortly", headers={"Retry-After": "2"})
+        if not self.supported:
+            raise HTTPException(status_code=501, detail="Model does not provide native feature contributions")
+
+        cached = self.cache.get(cache_key(row))
+        if cached is not None and "contributions" in cached:
+            return {**cached, "cached": True}
+
+        # Shed load: a row that can't be computed within the budget is refused now
+        if self.queued >= self.capacity():
+            raise HTTPException(
+                status_code=503,
+                detail="Too many explanations queued, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.queued += 1
+        fut.add_done_callback(self.dequeue)
+        self.pending.append((row, fut, request_threads.get()))
+        if len(self.pending) >= EXPLAIN_BATCH_SIZE:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(EXPLAIN_BATCH_WAIT, self.flush)
+
+        try:
+            # On timeout wait_for cancels fut, so run_batch skips the row
+            result = await asyncio.wait_for(fut, EXPLAIN_BUDGET)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Explanation is still being computed, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {**result, "cached": False}
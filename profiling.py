@@ -0,0 +1,288 @@
+import functools
+import hmac
+import inspect
+import os
+import re
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+# ---------- Settings (override with environment variables) ----------
+# Profiling is off unless PROFILE_TOKEN is set; the same token must be sent in
+# the X-Profile header (per request) or X-Profile-Token header (admin routes).
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR")  # also write profiles here if set
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))  # seconds between samples
+# A single request lasts milliseconds, so header-profiled requests sample faster
+PROFILE_REQUEST_INTERVAL = float(os.getenv("PROFILE_REQUEST_INTERVAL", "0.0002"))
+MAX_WINDOW_SECONDS = 300
+MAX_ACTIVE_SAMPLERS = 4
+MAX_STORED_PROFILES = 20
+
+# Threads parked in these modules are waiting, not working
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+# Idents of the threads running the request being profiled (set per request)
+request_threads: ContextVar[set | None] = ContextVar("request_threads", default=None)
+
+# X-Profile-Group values: stacks of every request tagged with the same group
+# are merged into one profile; also used as a file name under PROFILE_DIR
+GROUP_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def token_matches(token):
+    return token is not None and hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+@contextmanager
+def running_for(thread_sets):
+    # Register the current thread with the samplers of the given requests
+    # (request_threads values; None for requests that aren't profiled)
+    ident = threading.get_ident()
+    thread_sets = [threads for threads in thread_sets if threads is not None]
+    for threads in thread_sets:
+        threads.add(ident)
+    try:
+        yield
+    finally:
+        for threads in thread_sets:
+            threads.discard(ident)
+
+
+def track_thread(endpoint):
+    # Sync endpoints run on a threadpool thread; register it with the request's
+    # sampler (the context var is copied into the worker) while it runs.
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with running_for([request_threads.get()]):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = track_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def fold(frame, thread_name):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+# Samples thread stacks every `interval` seconds and counts them in the
+# collapsed "frame;frame;frame count" format read by flamegraph.pl and
+# speedscope. `threads` limits sampling to those idents (a live set, so
+# threads can join while it runs); None samples every other thread.
+class Sampler:
+    def __init__(self, interval=PROFILE_INTERVAL, threads=None):
+        self.interval = interval
+        self.threads = threads
+        self.counts = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_filename.endswith(IDLE_MODULES):
+                    continue
+                if self.threads is not None and ident not in self.threads:
+                    continue
+                self.counts[fold(frame, names.get(ident, str(ident)))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return self.counts
+
+
+def render(counts):
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class Profiler:
+    def __init__(self):
+        self.profiles = OrderedDict()
+        self.active = 0
+        self.lock = threading.RLock()
+        self.intervals = []  # sampling intervals of the active samplers
+        self.switch_interval = sys.getswitchinterval()
+        self.window = None
+        self.window_id = None
+        self.window_timer = None
+
+    def acquire(self, threads=None, interval=PROFILE_INTERVAL):
+        with self.lock:
+            if self.active >= MAX_ACTIVE_SAMPLERS:
+                return None
+            self.active += 1
+            self.intervals.append(interval)
+            self.update_switch_interval()
+        return Sampler(interval=interval, threads=threads).start()
+
+    def update_switch_interval(self):
+        # A thread running Python keeps the GIL for up to the switch interval
+        # (5 ms by default), so the sampler could never see short bursts such
+        # as JSON parsing or validation. Shorten it only while sampling.
+        if not self.intervals:
+            sys.setswitchinterval(self.switch_interval)
+        else:
+            sys.setswitchinterval(min(self.switch_interval, min(self.intervals) / 2))
+
+    def release(self, sampler, profile_id):
+        # Profiles with the same id (an X-Profile-Group) are merged
+        counts = sampler.stop()
+        with self.lock:
+            self.active -= 1
+            self.intervals.remove(sampler.interval)
+            self.update_switch_interval()
+            merged = self.profiles.pop(profile_id, Counter())
+            merged.update(counts)
+            self.profiles[profile_id] = merged
+            while len(self.profiles) > MAX_STORED_PROFILES:
+                self.profiles.popitem(last=False)
+            output = render(merged)
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w") as f:
+                f.write(output)
+
+    def start_window(self, seconds):
+        with self.lock:
+            if self.window is not None:
+                raise HTTPException(status_code=409, detail="A profiling window is already running")
+            sampler = self.acquire()
+            if sampler is None:
+                raise HTTPException(status_code=503, detail="Too many active profiles")
+            self.window = sampler
+            self.window_id = f"window-{uuid.uuid4().hex}"
+            self.window_timer = threading.Timer(seconds, self.stop_window)
+            self.window_timer.daemon = True
+            self.window_timer.start()
+            return self.window_id
+
+    def stop_window(self):
+        with self.lock:
+            sampler, self.window = self.window, None
+            profile_id = self.window_id
+            if self.window_timer is not None:
+                self.window_timer.cancel()
+        if sampler is not None:
+            self.release(sampler, profile_id)
+        return profile_id
+
+
+# ASGI middleware: a request carrying "X-Profile: <token>" is sampled while it
+# runs and answered with an X-Profile-Id header. Adding "X-Profile-Group: <id>"
+# merges the samples of every request tagged with that id into one profile.
+# With profiling disabled this is a single check before passing the request on.
+class ProfilingMiddleware:
+    def __init__(self, app, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if PROFILE_TOKEN is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = group = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                token = value.decode("latin-1")
+            elif name == b"x-profile-group":
+                group = value.decode("latin-1")
+        if not token_matches(token):
+            await self.app(scope, receive, send)
+            return
+        # Sample only this request: the event loop thread plus any worker
+        # thread its sync endpoint runs on (see ProfiledRoute)
+        threads = {threading.get_ident()}
+        sampler = self.profiler.acquire(threads, PROFILE_REQUEST_INTERVAL)
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+        context_token = request_threads.set(threads)
+
+        if group is not None and GROUP_PATTERN.fullmatch(group):
+            profile_id = f"group-{group}"
+        else:
+            profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + [
+                    (b"x-profile-id", profile_id.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_threads.reset(context_token)
+            # Joining the sampler and writing PROFILE_DIR would block the loop
+            await run_in_threadpool(self.profiler.release, sampler, profile_id)
+
+
+def add_profiling(app: FastAPI):
+    profiler = Profiler()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    # Routes declared after this point record their worker thread for sampling
+    app.router.route_class = ProfiledRoute
+
+    def check_token(token):
+        if PROFILE_TOKEN is None or not token_matches(token):
+            raise HTTPException(status_code=404, detail="Not Found")
+
+    # Profile every request for the next `seconds`
+    @app.post("/admin/profile/start")
+    def start_profile(seconds: float = 30, x_profile_token: str | None = Header(None)):
+        check_token(x_profile_token)
+        seconds = min(max(seconds, 0.1), MAX_WINDOW_SECONDS)
+        return {"profile_id": profiler.start_window(seconds), "seconds": seconds}
+
+    @app.post("/admin/profile/stop")
+    def stop_profile(x_profile_token: str | None = Header(None)):
+        check_token(x_profile_token)
+        if profiler.window is None:
+            raise HTTPException(status_code=409, detail="No profiling window is running")
+        return {"profile_id": profiler.stop_window()}
+
+    @app.get("/admin/profiles")
+    def list_profiles(x_profile_token: str | None = Header(None)):
+        check_token(x_profile_token)
+        return {"profiles": list(profiler.profiles), "running": profiler.window_id if profiler.window else None}
+
+    # Collapsed stacks, ready for flamegraph.pl or speedscope
+    @app.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+    def get_profile(profile_id: str, x_profile_token: str | None = Header(None)):
+        check_token(x_profile_token)
+        counts = profiler.profiles.get(profile_id)
+        if counts is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return render(counts)
+
+    return profiler
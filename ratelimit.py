@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+# ---------- Settings (override with environment variables) ----------
+RATE_LIMIT_RATE = float(os.getenv("RATE_LIMIT_RATE", "10"))     # tokens per second per client
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))     # bucket size
+MAX_CONCURRENT = int(os.getenv("MAX_CONCURRENT_PREDICTIONS", "8"))  # in-flight requests per model
+MAX_TRACKED_CLIENTS = 10000
+# Comma-separated API keys that get their own bucket; any other client
+# (including one sending an unknown X-API-Key) is limited by IP.
+API_KEYS = frozenset(k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip())
+
+LIMITED_PATHS = {"/predict", "/explain"}
+
+
+# In-memory token buckets, one per client key, holding at most `max_clients`
+# and evicting the least recently used. Any object with the same async
+# take(key, rate, burst) method (e.g. a Redis-backed or local stand-in store)
+# can be passed to RateLimitMiddleware instead; it's awaited on the event loop,
+# so networked stores must not block.
+class MemoryBackend:
+    def __init__(self, max_clients=MAX_TRACKED_CLIENTS):
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+
+    async def take(self, key, rate, burst):
+        # Returns (allowed, remaining tokens, seconds until next token)
+        now = time.monotonic()
+        bucket = self.buckets.pop(key, None)
+        if bucket is None:
+            while len(self.buckets) >= self.max_clients:
+                self.buckets.popitem(last=False)
+            tokens = burst
+        else:
+            tokens, last = bucket
+            tokens = min(burst, tokens + (now - last) * rate)
+
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            return True, int(tokens - 1), 0.0
+        self.buckets[key] = (tokens, now)
+        return False, 0, (1 - tokens) / rate
+
+
+def client_key(scope, api_keys=API_KEYS):
+    if api_keys:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-api-key":
+                key = value.decode("latin-1")
+                if key in api_keys:
+                    return "key:" + key
+                break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+# Pure ASGI middleware (no per-request Request objects) to keep overhead low
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None, rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST,
+                 max_concurrent=MAX_CONCURRENT, paths=LIMITED_PATHS):
+        self.app = app
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.paths = paths
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        # Check capacity first so a busy rejection doesn't spend the client's quota
+        if self.in_flight >= self.max_concurrent:
+            await self.reject(send, "Server busy, too many concurrent predictions", 1, None)
+            return
+        allowed, remaining, retry_after = await self.backend.take(client_key(scope), self.rate, self.burst)
+        if not allowed:
+            await self.reject(send, "Rate limit exceeded", retry_after, remaining)
+            return
+
+        headers = [
+            (b"x-ratelimit-limit", str(self.burst).encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+        ]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + headers
+            await send(message)
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            self.in_flight -= 1
+
+    async def reject(self, send, detail, retry_after, remaining):
+        body = json.dumps({"detail": detail}).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            (b"x-ratelimit-limit", str(self.burst).encode()),
+        ]
+        if remaining is not None:
+            headers.append((b"x-ratelimit-remaining", str(remaining).encode()))
+        await send({"type": "http.response.start", "status": 429, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Micro-benchmark of the middleware's per-request overhead: python ratelimit.py
+if __name__ == "__main__":
+    import asyncio
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    async def run(app, n):
+        scope = {"type": "http", "method": "POST", "path": "/predict",
+                 "headers": [], "client": ("127.0.0.1", 5000)}
+        started = time.perf_counter()
+        for _ in range(n):
+            await app(scope, receive, send)
+        return (time.perf_counter() - started) / n * 1e6
+
+    n = 200000
+    limited = RateLimitMiddleware(endpoint, rate=1e9, burst=10**9)
+    base = asyncio.run(run(endpoint, n))
+    with_limit = asyncio.run(run(limited, n))
+    print(f"without limiter: {base:.2f} us/request")
+    print(f"with limiter:    {with_limit:.2f} us/request")
+    print(f"overhead:        {with_limit - base:.2f} us/request")
@@ -115,6 +115,7 @@ function PredictionForm({ selectedModel }) {
   const [isListening, setIsListening] = useState(false);
   const [isChatting, setIsChatting] = useState(false);
   const [callId, setCallId] = useState(null);
+  const [formSessionId, setFormSessionId] = useState(null);
 
   const recognitionRef = useRef(null);
   const synthesisRef = useRef(null);
@@ -324,6 +325,7 @@ function PredictionForm({ selectedModel }) {
     const handleCallEnded = () => {
       console.log("Voice call ended.");
       setIsChatting(false);
+      setFormSessionId(null);
       speakResult("Call ended. Check your updated form!");
     };
 
@@ -360,6 +362,35 @@ function PredictionForm({ selectedModel }) {
     };
   }, [speakResult]);
 
+  // Subscribe to form updates pushed by the voice agent for this call
+  useEffect(() => {
+    if (!formSessionId) return undefined;
+
+    const source = new EventSource(`http://127.0.0.1:8000/form-events/${formSessionId}`);
+
+    source.addEventListener("snapshot", (event) => {
+      const fields = JSON.parse(event.data);
+      setInputs(prev => ({ ...prev, ...fields }));
+    });
+
+    source.addEventListener("update", (event) => {
+      const { field, value } = JSON.parse(event.data);
+      setInputs(prev => ({ ...prev, [field]: value }));
+    });
+
+    source.onerror = (error) => {
+      console.error("Form update stream error:", error);
+    };
+
+    return () => {
+      source.close();
+      // The call is over: drop its form state on the server
+      axios.delete(`http://127.0.0.1:8000/form-state/${formSessionId}`).catch((error) => {
+        console.error("Failed to clear form state:", error);
+      });
+    };
+  }, [formSessionId]);
+
   // Reset form when model changes
   useEffect(() => {
     setInputs({});
@@ -407,7 +438,7 @@ function PredictionForm({ selectedModel }) {
       const response = await axios.post("http://127.0.0.1:8000/start-web-call", {
         agent_id: "agent_73c01dd3f7260d7b433b8d48cc"
       });
-      const { access_token } = response.data;
+      const { access_token, call_id } = response.data;
 
       const newCallId = await retellClient.current.startCall({
         accessToken: access_token,
@@ -415,6 +446,7 @@ function PredictionForm({ selectedModel }) {
         emitRawAudioSamples: false,
       });
       setCallId(newCallId);
+      setFormSessionId(call_id || null);
       setIsChatting(true);
     } catch (error) {
       console.error("Failed to start voice agent:", error);
@@ -428,6 +460,7 @@ function PredictionForm({ selectedModel }) {
     }
     setIsChatting(false);
     setCallId(null);
+    setFormSessionId(null);
   }, [callId]);
 
   // Transform data for Cancer Diagnosis
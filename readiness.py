@@ -0,0 +1,88 @@
+import pickle
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+
+# Loads the model in a background thread so the server can accept connections
+# (and answer liveness probes) straight away. pandas / sklearn / xgboost are
+# only imported here, off the startup path.
+class ModelState:
+    def __init__(self, path, warmup_input, on_load=None):
+        self.path = path
+        self.warmup_input = warmup_input
+        self.on_load = on_load
+        self.model = None
+        self.ready = False
+        self.error = None
+        self.load_seconds = None
+
+    def start(self):
+        threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+
+    def require(self):
+        # The model for a request: 503 while it's still loading, 500 if loading failed
+        if self.model is not None:
+            return self.model
+        if self.error is not None:
+            raise HTTPException(status_code=500, detail="Model not loaded")
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading, retry shortly",
+            headers={"Retry-After": "2"},
+        )
+
+    def load(self):
+        started = time.perf_counter()
+        try:
+            import pandas as pd
+
+            with open(self.path, "rb") as f:
+                model = pickle.load(f)
+
+            # Warm-up prediction: first call pays for lazy init inside the model.
+            # The model is only published once this succeeds, so every route
+            # agrees on whether it's usable.
+            model.predict(pd.DataFrame([self.warmup_input]))
+            if self.on_load is not None:
+                self.on_load(model)
+            self.model = model
+            self.ready = True
+            print("✅ Model loaded successfully")
+        except Exception as e:
+            self.error = str(e)
+            print("⚠️ Could not load model:", e)
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+
+
+def add_health_routes(app: FastAPI, state: ModelState):
+    previous_lifespan = app.router.lifespan_context
+
+    # Start loading the model at startup, keeping any lifespan already set
+    @asynccontextmanager
+    async def lifespan(app):
+        state.start()
+        async with previous_lifespan(app) as value:
+            yield value
+
+    app.router.lifespan_context = lifespan
+
+    # Liveness: the process is up and serving requests
+    @app.get("/healthz")
+    def healthz():
+        return {"status": "ok"}
+
+    # Readiness: model loaded and a warm-up prediction succeeded
+    @app.get("/readyz")
+    def readyz():
+        body = {
+            "ready": state.ready,
+            "model_loaded": state.model is not None,
+            "load_seconds": state.load_seconds,
+            "error": state.error,
+        }
+        return JSONResponse(body, status_code=200 if state.ready else 503)
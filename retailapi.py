@@ -1,8 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from retell import Retell  # Ensure this matches your installed SDK
+from collections import OrderedDict
+import asyncio
+import json
 import os
+import time
 import uvicorn
 
 app = FastAPI()
@@ -25,6 +30,87 @@ retell = Retell(api_key=API_KEY)
 class FormUpdate(BaseModel):
     field: str
     value: object
+    call_id: str  # session the update belongs to
+
+# Retell custom-function request body: {"name": ..., "call": {...}, "args": {...}}
+class RetellCall(BaseModel):
+    call_id: str
+
+class FormUpdateArgs(BaseModel):
+    field: str
+    value: object
+
+class RetellFunctionCall(BaseModel):
+    call: RetellCall
+    args: FormUpdateArgs
+
+
+# ---------- Form update fan-out ----------
+# Each subscriber keeps only the latest value per field, so a burst of updates
+# to the same field is coalesced into one event, and the number of distinct
+# pending fields is capped so a slow client can't grow memory without bound.
+MAX_PENDING_FIELDS = 64
+KEEPALIVE_SECONDS = 15
+# Form state is dropped when the call ends; these bound what's left behind
+MAX_FORM_SESSIONS = 1000
+FORM_STATE_TTL = 3600  # seconds since the last update
+MAX_CLOSED_CALLS = 1000  # recently closed calls whose late updates are ignored
+
+
+class FormSubscriber:
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.resync = False
+        self.ready = asyncio.Event()
+
+    def push(self, field, value):
+        self.pending.pop(field, None)
+        self.pending[field] = value
+        if len(self.pending) > MAX_PENDING_FIELDS:
+            # Too far behind: drop the backlog and send a full snapshot instead
+            self.pending.clear()
+            self.resync = True
+        self.ready.set()
+
+    def drain(self):
+        batch, resync = self.pending, self.resync
+        self.pending, self.resync = OrderedDict(), False
+        self.ready.clear()
+        return batch, resync
+
+
+# call_id -> latest form state (least recently updated first) / connected subscribers
+form_state: OrderedDict[str, dict] = OrderedDict()
+form_updated: dict[str, float] = {}
+form_subscribers: dict[str, set[FormSubscriber]] = {}
+closed_calls: OrderedDict[str, None] = OrderedDict()
+
+
+def expire_form_state(now):
+    while form_state:
+        oldest = next(iter(form_state))
+        if len(form_state) <= MAX_FORM_SESSIONS and now - form_updated[oldest] < FORM_STATE_TTL:
+            break
+        form_state.popitem(last=False)
+        form_updated.pop(oldest, None)
+
+
+def publish_form_update(call_id, field, value):
+    if call_id in closed_calls:
+        # The agent's last function call can land after the call was closed
+        return
+    now = time.monotonic()
+    fields = form_state.pop(call_id, {})
+    fields[field] = value
+    form_state[call_id] = fields
+    form_updated[call_id] = now
+    expire_form_state(now)
+    for subscriber in form_subscribers.get(call_id, ()):
+        subscriber.push(field, value)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 @app.post("/start-web-call")
 async def start_web_call():
@@ -40,15 +126,79 @@ async def start_web_call():
         else:
             raise AttributeError("No method found to start web call in Retell SDK")
         
-        return {"access_token": web_call.access_token}
+        return {
+            "access_token": web_call.access_token,
+            "call_id": getattr(web_call, "call_id", None),
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/update-form")
-async def update_form(update: FormUpdate):
-    print(f"Updated {update.field} to {update.value}")
+async def update_form(update: FormUpdate | RetellFunctionCall, request: Request):
+    # Only Retell may write form state: check its signature over the body
+    post_data = await request.json()
+    valid_signature = retell.verify(
+        json.dumps(post_data, separators=(",", ":"), ensure_ascii=False),
+        api_key=API_KEY,
+        signature=str(request.headers.get("X-Retell-Signature")),
+    )
+    if not valid_signature:
+        raise HTTPException(status_code=401, detail="Invalid Retell signature")
+
+    if isinstance(update, RetellFunctionCall):
+        publish_form_update(update.call.call_id, update.args.field, update.args.value)
+    else:
+        publish_form_update(update.call_id, update.field, update.value)
     return {"status": "updated"}
 
+@app.get("/form-state/{call_id}")
+async def get_form_state(call_id: str):
+    return {"call_id": call_id, "fields": form_state.get(call_id, {})}
+
+@app.delete("/form-state/{call_id}")
+async def clear_form_state(call_id: str):
+    form_state.pop(call_id, None)
+    form_updated.pop(call_id, None)
+    closed_calls[call_id] = None
+    while len(closed_calls) > MAX_CLOSED_CALLS:
+        closed_calls.popitem(last=False)
+    return {"status": "cleared"}
+
+# Server-Sent Events stream of FormUpdate events for one call
+@app.get("/form-events/{call_id}")
+async def form_events(call_id: str, request: Request):
+    subscriber = FormSubscriber()
+    form_subscribers.setdefault(call_id, set()).add(subscriber)
+
+    async def stream():
+        try:
+            # Send the current state first so late joiners catch up
+            yield sse_event("snapshot", form_state.get(call_id, {}))
+            while not await request.is_disconnected():
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                batch, resync = subscriber.drain()
+                if resync:
+                    yield sse_event("snapshot", form_state.get(call_id, {}))
+                    continue
+                for field, value in batch.items():
+                    yield sse_event("update", {"field": field, "value": value})
+        finally:
+            subscribers = form_subscribers.get(call_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    form_subscribers.pop(call_id, None)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Optional: Endpoint to update agent voice (for testing; remove if not needed)
 @app.post("/update-agent-voice")
 async def update_agent_voice(voice_id: str):